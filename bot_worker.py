@@ -0,0 +1,82 @@
+import os
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import make_engine
+from crud import ensure_user_and_family
+from logging_config import configure_logging
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.filters import Command
+
+configure_logging()
+
+# --- Environment ---
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# --- Database ---
+# The bot only serves /start, so a small pool of its own is enough
+bot_engine = make_engine(pool_size=2, max_overflow=0)
+BotSessionLocal = sessionmaker(bot_engine, class_=AsyncSession, expire_on_commit=False)
+
+# join_family() is defined in migration 0004
+_JOIN_FAMILY = text("SELECT status FROM join_family(:tg, :un, :code)")
+
+# --- Bot Setup ---
+dp = Dispatcher()
+
+# --- Bot Handlers ---
+
+@dp.message(Command("start"))
+async def cmd_start(message: types.Message):
+    if not message.from_user:
+        return
+
+    args = message.text.split()
+    invite_code = args[1] if len(args) > 1 else None
+    
+    telegram_id = message.from_user.id
+    username = message.from_user.username
+
+    async with BotSessionLocal() as session:
+        if invite_code and invite_code.startswith("invite_"):
+            code = invite_code.replace("invite_", "")
+            # Lookup, membership check and insert/update all happen server-side
+            result = await session.execute(
+                _JOIN_FAMILY, {"tg": telegram_id, "un": username, "code": code}
+            )
+            status = result.scalar_one()
+            await session.commit()
+
+            if status == "joined":
+                await message.answer("Вы успешно присоединились к семье!")
+            elif status == "already_member":
+                await message.answer("Вы уже в этой семье.")
+            elif status == "created":
+                await message.answer("Добро пожаловать! Вы присоединились к семье.")
+            else:
+                await message.answer("Неверный код приглашения.")
+                # Fallback to normal init
+                await ensure_user_and_family(session, telegram_id, username)
+                await session.commit()
+        else:
+            await ensure_user_and_family(session, telegram_id, username)
+            await session.commit()
+            await message.answer("Добро пожаловать в Lumina Grocer!")
+
+
+async def main():
+    if not BOT_TOKEN:
+        raise ValueError("BOT_TOKEN is not set")
+
+    bot = Bot(token=BOT_TOKEN)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await bot_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import User
+
+# Creates the family and user only if the user doesn't exist yet, and returns
+# the user row either way, in one round-trip. If a concurrent transaction
+# (another /auth, or join_family() from the bot) inserts the same user after
+# this statement's snapshot, the user insert is skipped and no row comes back.
+_ENSURE_USER_AND_FAMILY = text("""
+    WITH fam AS (
+        INSERT INTO families (invite_code)
+        SELECT :invite_code
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE telegram_id = :telegram_id)
+        RETURNING id
+    ), u AS (
+        INSERT INTO users (telegram_id, username, family_id)
+        SELECT :telegram_id, :username, (SELECT id FROM fam)
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE telegram_id = :telegram_id)
+        ON CONFLICT (telegram_id) DO NOTHING
+        RETURNING *
+    )
+    SELECT * FROM u
+    UNION ALL
+    SELECT * FROM users WHERE telegram_id = :telegram_id
+""")
+
+_DELETE_UNUSED_FAMILY = text("""
+    DELETE FROM families f
+    WHERE f.invite_code = :invite_code
+      AND NOT EXISTS (SELECT 1 FROM users u WHERE u.family_id = f.id)
+""")
+
+
+async def ensure_user_and_family(session: AsyncSession, telegram_id: int, username: str = None):
+    invite_code = uuid.uuid4().hex[:8]
+    result = await session.execute(
+        select(User).from_statement(_ENSURE_USER_AND_FAMILY),
+        {"invite_code": invite_code, "telegram_id": telegram_id, "username": username},
+    )
+    user = result.scalars().first()
+
+    if user is None:
+        # Lost the race: drop the family created for us and read the winner's row,
+        # which a new statement can see once the other transaction has committed
+        await session.execute(_DELETE_UNUSED_FAMILY, {"invite_code": invite_code})
+        result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalars().one()
+
+    return user
@@ -1,7 +1,8 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
-from urllib.parse import urlparse, urlunparse
+from typing import Optional
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import declarative_base
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
 Base = declarative_base()
 
@@ -16,15 +17,39 @@ def get_database_url():
         # Replace scheme with postgresql+asyncpg
         new_scheme = "postgresql+asyncpg"
         # Handle port 5433 or others explicitly if needed, but urlparse handles :port correctly
-        url = urlunparse(parsed._replace(scheme=new_scheme))
+        parsed = parsed._replace(scheme=new_scheme)
+
+    # SQLAlchemy's asyncpg dialect reads its prepared statement cache size from the URL
+    query = dict(parse_qsl(parsed.query))
+    query.setdefault("prepared_statement_cache_size", "2048")
+    url = urlunparse(parsed._replace(query=urlencode(query)))
     
     return url
 
 DATABASE_URL = get_database_url()
+SQL_ECHO = os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def make_engine(pool_size: Optional[int] = None, max_overflow: Optional[int] = None):
+    # Pool sized explicitly per process; SQLAlchemy keeps its
+    # AsyncAdaptedQueuePool for async engines, so no poolclass is passed here.
+    # Every uvicorn worker gets its own pool, so size DB_POOL_SIZE/DB_MAX_OVERFLOW
+    # so that workers * (pool + overflow) stays under Postgres max_connections.
+    if pool_size is None:
+        pool_size = int(os.getenv("DB_POOL_SIZE", "20"))
+    if max_overflow is None:
+        max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "30"))
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
+    return create_async_engine(
+        DATABASE_URL,
+        echo=False, # SQL_ECHO is applied through logging_config instead
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_timeout=10,
+        query_cache_size=1200,
+        connect_args={
+            "server_settings": {"application_name": "pokupki"},
+            "statement_cache_size": 2048,
+        },
+    )
@@ -0,0 +1,19 @@
+import os
+import logging
+
+from pythonjsonlogger.json import JsonFormatter
+
+from database import SQL_ECHO
+
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    # SQL statements are logged at INFO only when SQL_ECHO is set. The engine is
+    # built with echo=False so they go through the JSON handler above, once.
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if SQL_ECHO else logging.WARNING)
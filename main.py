@@ -1,31 +1,25 @@
-import os
-import asyncio
-import uuid
 from typing import List, Optional
 
 from fastapi import FastAPI, Depends, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
-from pydantic import BaseModel
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import delete, insert, update, text, bindparam, literal, values, column, String, Boolean, JSON
+from pydantic import BaseModel, ConfigDict
+from cachetools import TTLCache
+import orjson
 
-from database import engine, Base, get_db
-from models import Family, User, Item
+from database import make_engine
+from models import User, Item
+from crud import ensure_user_and_family
+from logging_config import configure_logging
 
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
-
-# --- Environment ---
-DATABASE_URL = os.getenv("DATABASE_URL")
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-
-if not BOT_TOKEN:
-    print("Warning: BOT_TOKEN not set. Bot features will not work.")
+configure_logging()
 
 # --- App Setup ---
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,9 +29,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Bot Setup ---
-bot = Bot(token=BOT_TOKEN) if BOT_TOKEN else None
-dp = Dispatcher()
+# --- Database ---
+engine = make_engine()
+AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_db():
+    # One transaction per request. Write endpoints commit explicitly before
+    # returning, so the commit can't land after the response on newer FastAPI;
+    # anything left uncommitted is rolled back when the session closes.
+    # The session only checks a connection out of the pool on its first
+    # statement, so endpoints that never query are free.
+    async with AsyncSessionLocal() as session:
+        yield session
+
+# Upper bound on rows accepted by a single /items/bulk request
+BULK_MAX_ITEMS = 1000
+
+# --- Caches ---
+# telegram_id -> family_id; only changes when a user joins a family via /start.
+# The cache is per worker and the bot can't invalidate it, so an entry may name
+# the old family for up to the TTL. It is only used to tell whether a user
+# exists; every item query resolves the family from users itself.
+_family_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# --- Statements ---
+# Built once at import; endpoints pass values through bind parameters
+_FAMILY_ID_BY_TG = select(User.family_id).where(User.telegram_id == bindparam("tid"))
+
+_ITEMS_OF_USER = select(Item).where(Item.family_id == _FAMILY_ID_BY_TG.scalar_subquery())
+
+_ITEM_INSERT_COLUMNS = ["id", "text", "is_bought", "category", "family_id"]
+
+# Item statements check membership against users rather than the cache,
+# so a user who just switched families can't touch the old family's items
+_OWNED_ITEM = (Item.id == bindparam("item_id")) & (
+    Item.family_id == _FAMILY_ID_BY_TG.scalar_subquery()
+)
+
+_OWNED_ITEM_BY_ID = select(Item).where(_OWNED_ITEM)
+
+_DELETE_OWNED_ITEM = (
+    delete(Item)
+    .where(_OWNED_ITEM)
+    .returning(Item.id)
+    .execution_options(synchronize_session=False)
+)
+
+_FAMILY_WITH_MEMBERS = text("""
+    SELECT f.id, f.invite_code,
+           COALESCE(
+               json_agg(json_build_object(
+                   'telegram_id', u.telegram_id,
+                   'username', u.username
+               )) FILTER (WHERE u.telegram_id IS NOT NULL),
+               '[]'
+           ) AS members
+    FROM families f
+    LEFT JOIN users u ON u.family_id = f.id
+    WHERE f.id = :fid
+    GROUP BY f.id
+""").columns(members=JSON)
 
 # --- Pydantic Models ---
 class ItemCreate(BaseModel):
@@ -62,160 +113,184 @@ class FamilyMember(BaseModel):
     telegram_id: int
     username: Optional[str]
 
-# --- Bot Handlers ---
+class ItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-async def ensure_user_and_family(session: AsyncSession, telegram_id: int, username: str = None):
-    result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result.scalars().first()
+    id: str
+    text: Optional[str] = None
+    is_bought: Optional[bool] = None
+    category: Optional[str] = None
+    family_id: Optional[int] = None
 
-    if not user:
-        # Create new family for new user
-        invite_code = uuid.uuid4().hex[:8]
-        new_family = Family(invite_code=invite_code)
-        session.add(new_family)
-        await session.flush() # get ID
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-        user = User(telegram_id=telegram_id, username=username, family_id=new_family.id)
-        session.add(user)
-        await session.commit()
-    
-    return user
+    telegram_id: int
+    username: Optional[str] = None
+    family_id: Optional[int] = None
 
-@dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    if not message.from_user:
-        return
+class FamilyOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-    args = message.text.split()
-    invite_code = args[1] if len(args) > 1 else None
-    
-    telegram_id = message.from_user.id
-    username = message.from_user.username
-
-    async with AsyncSession(engine) as session:
-        if invite_code and invite_code.startswith("invite_"):
-            code = invite_code.replace("invite_", "")
-            # Find family
-            result = await session.execute(select(Family).where(Family.invite_code == code))
-            family = result.scalars().first()
-            
-            if family:
-                # Check if user exists
-                result_user = await session.execute(select(User).where(User.telegram_id == telegram_id))
-                user = result_user.scalars().first()
-                
-                if user:
-                    if user.family_id != family.id:
-                        user.family_id = family.id
-                        await session.commit()
-                        await message.answer("Вы успешно присоединились к семье!")
-                    else:
-                        await message.answer("Вы уже в этой семье.")
-                else:
-                    # Create user in this family
-                    user = User(telegram_id=telegram_id, username=username, family_id=family.id)
-                    session.add(user)
-                    await session.commit()
-                    await message.answer("Добро пожаловать! Вы присоединились к семье.")
-            else:
-                await message.answer("Неверный код приглашения.")
-                # Fallback to normal init
-                await ensure_user_and_family(session, telegram_id, username)
-        else:
-            await ensure_user_and_family(session, telegram_id, username)
-            await message.answer("Добро пожаловать в Lumina Grocer!")
+    id: int
+    invite_code: str
 
-# --- API Endpoints ---
+class BulkCreateOut(BaseModel):
+    status: str
+    count: int
 
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    if bot:
-        asyncio.create_task(dp.start_polling(bot))
+class AuthOut(BaseModel):
+    user: UserOut
+    family: FamilyOut
+    members: List[FamilyMember]
+
+# --- Helpers ---
 
-@app.post("/auth")
+async def get_family_id(session: AsyncSession, telegram_id: int) -> Optional[int]:
+    family_id = _family_cache.get(telegram_id)
+    if family_id is None:
+        result = await session.execute(_FAMILY_ID_BY_TG, {"tid": telegram_id})
+        family_id = result.scalars().first()
+        if family_id is not None:
+            _family_cache[telegram_id] = family_id
+    return family_id
+
+# --- API Endpoints ---
+
+@app.post("/auth", response_model=AuthOut)
 async def auth_user(user_info: UserInfo, db: AsyncSession = Depends(get_db)):
     user = await ensure_user_and_family(db, user_info.telegram_id, user_info.username)
-    
-    # Get family info
-    result_family = await db.execute(select(Family).where(Family.id == user.family_id))
-    family = result_family.scalars().first()
-    
-    # Get members
-    result_members = await db.execute(select(User).where(User.family_id == family.id))
-    members = result_members.scalars().all()
+
+    # Family info and members in one query, members aggregated to JSON by Postgres
+    result_family = await db.execute(_FAMILY_WITH_MEMBERS, {"fid": user.family_id})
+    family = result_family.mappings().one()
+
+    await db.commit()
+
+    # The Mini App calls /auth on open, so GET /items right after is a cache hit
+    _family_cache[user_info.telegram_id] = user.family_id
     
     return {
         "user": user,
-        "family": family,
-        "members": members
+        "family": {"id": family["id"], "invite_code": family["invite_code"]},
+        "members": family["members"]
     }
 
-@app.get("/items")
-async def get_items(telegram_id: int = Header(...), db: AsyncSession = Depends(get_db)):
-    result_user = await db.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result_user.scalars().first()
-    if not user:
+async def _stream_items(telegram_id: int):
+    # Runs after the endpoint has returned, so it needs its own session
+    async with AsyncSessionLocal() as session:
+        yield b"["
+        first = True
+        async for item in await session.stream_scalars(_ITEMS_OF_USER, {"tid": telegram_id}):
+            yield (b"" if first else b",") + orjson.dumps({
+                "id": item.id,
+                "text": item.text,
+                "is_bought": item.is_bought,
+                "category": item.category,
+                "family_id": item.family_id,
+            })
+            first = False
+        yield b"]"
+
+@app.get("/items", response_model=List[ItemOut])
+async def get_items(telegram_id: int = Header(...)):
+    # No request-scoped session here since the body streams from its own;
+    # this one only checks out a connection on a cache miss
+    async with AsyncSessionLocal() as db:
+        family_id = await get_family_id(db, telegram_id)
+    if family_id is None:
         raise HTTPException(status_code=404, detail="User not found")
-        
-    result_items = await db.execute(select(Item).where(Item.family_id == user.family_id))
-    items = result_items.scalars().all()
-    return items
 
-@app.post("/items")
+    # The stream resolves the family from users, so a stale cache entry on this
+    # worker can't serve the list of a family the user has left
+    return StreamingResponse(_stream_items(telegram_id), media_type="application/json")
+
+@app.post("/items", response_model=ItemOut)
 async def create_item(item: ItemCreate, telegram_id: int = Header(...), db: AsyncSession = Depends(get_db)):
-    result_user = await db.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result_user.scalars().first()
-    if not user:
+    # family_id is resolved from users inside the INSERT, not from the cache
+    result = await db.execute(
+        insert(Item.__table__)
+        .from_select(
+            _ITEM_INSERT_COLUMNS,
+            select(
+                literal(item.id),
+                literal(item.text),
+                literal(item.is_bought),
+                literal(item.category),
+                User.family_id,
+            ).where(User.telegram_id == telegram_id),
+        )
+        .returning(*Item.__table__.c)
+    )
+    new_item = result.mappings().first()
+    if new_item is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    new_item = Item(
-        id=item.id,
-        text=item.text,
-        is_bought=item.is_bought,
-        category=item.category,
-        family_id=user.family_id
+    await db.commit()
+    return dict(new_item)
+
+@app.post("/items/bulk", response_model=BulkCreateOut)
+async def create_items_bulk(items: List[ItemCreate], telegram_id: int = Header(...), db: AsyncSession = Depends(get_db)):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    if not items:
+        if await get_family_id(db, telegram_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return {"status": "created", "count": 0}
+
+    # One INSERT ... SELECT over a VALUES list, joined to the user's row for family_id
+    rows = values(
+        column("id", String),
+        column("text", String),
+        column("is_bought", Boolean),
+        column("category", String),
+        name="new_items",
+    ).data([(i.id, i.text, i.is_bought, i.category) for i in items])
+    result = await db.execute(
+        insert(Item.__table__).from_select(
+            _ITEM_INSERT_COLUMNS,
+            select(rows.c.id, rows.c.text, rows.c.is_bought, rows.c.category, User.family_id)
+            .select_from(rows)
+            .join(User, User.telegram_id == telegram_id),
+        )
     )
-    db.add(new_item)
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+
     await db.commit()
-    return new_item
+    return {"status": "created", "count": result.rowcount}
 
-@app.put("/items/{item_id}")
+@app.put("/items/{item_id}", response_model=ItemOut)
 async def update_item(item_id: str, updates: ItemUpdate, telegram_id: int = Header(...), db: AsyncSession = Depends(get_db)):
-    result_user = await db.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result_user.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    changes = updates.model_dump(exclude_none=True)
+    if not changes:
+        # Nothing to write: same ownership check as the UPDATE, in one round-trip
+        result_item = await db.execute(_OWNED_ITEM_BY_ID, {"item_id": item_id, "tid": telegram_id})
+        item = result_item.scalars().first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return item
 
-    result_item = await db.execute(select(Item).where(Item.id == item_id, Item.family_id == user.family_id))
+    result_item = await db.execute(
+        update(Item)
+        .where(_OWNED_ITEM)
+        .values(**changes)
+        .returning(Item)
+        .execution_options(synchronize_session=False),
+        {"item_id": item_id, "tid": telegram_id},
+    )
     item = result_item.scalars().first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    if updates.text is not None:
-        item.text = updates.text
-    if updates.is_bought is not None:
-        item.is_bought = updates.is_bought
-    if updates.category is not None:
-        item.category = updates.category
-        
+
     await db.commit()
     return item
 
 @app.delete("/items/{item_id}")
 async def delete_item(item_id: str, telegram_id: int = Header(...), db: AsyncSession = Depends(get_db)):
-    result_user = await db.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result_user.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    result_item = await db.execute(select(Item).where(Item.id == item_id, Item.family_id == user.family_id))
-    item = result_item.scalars().first()
-    if not item:
+    result_item = await db.execute(_DELETE_OWNED_ITEM, {"item_id": item_id, "tid": telegram_id})
+    if result_item.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    await db.delete(item)
     await db.commit()
     return {"status": "deleted"}
@@ -0,0 +1,59 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "families",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("invite_code", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_families_id", "families", ["id"])
+    op.create_index("ix_families_invite_code", "families", ["invite_code"], unique=True)
+
+    op.create_table(
+        "users",
+        sa.Column("telegram_id", sa.BigInteger(), nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("family_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["family_id"], ["families.id"]),
+        sa.PrimaryKeyConstraint("telegram_id"),
+    )
+    op.create_index("ix_users_telegram_id", "users", ["telegram_id"])
+
+    op.create_table(
+        "items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("is_bought", sa.Boolean(), nullable=True),
+        sa.Column("category", sa.String(), nullable=True),
+        sa.Column("family_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["family_id"], ["families.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_items_id", "items", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_items_id", table_name="items")
+    op.drop_table("items")
+    op.drop_index("ix_users_telegram_id", table_name="users")
+    op.drop_table("users")
+    op.drop_index("ix_families_invite_code", table_name="families")
+    op.drop_index("ix_families_id", table_name="families")
+    op.drop_table("families")
@@ -0,0 +1,27 @@
+"""items (family_id, id) index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The primary key already indexes items.id
+    op.drop_index("ix_items_id", table_name="items")
+    op.create_index("ix_items_family_id_id", "items", ["family_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_items_family_id_id", table_name="items")
+    op.create_index("ix_items_id", "items", ["id"])
@@ -0,0 +1,58 @@
+"""join_family function
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Status is one of: bad_code, created, joined, already_member
+    op.execute("""
+        CREATE OR REPLACE FUNCTION join_family(p_tg_id bigint, p_username text, p_invite text)
+        RETURNS TABLE (status text, family_id integer)
+        LANGUAGE plpgsql AS $$
+        #variable_conflict use_column
+        DECLARE
+            v_fid integer;
+            v_created boolean;
+        BEGIN
+            SELECT f.id INTO v_fid FROM families f WHERE f.invite_code = p_invite;
+            IF NOT FOUND THEN
+                RETURN QUERY SELECT 'bad_code'::text, NULL::integer;
+                RETURN;
+            END IF;
+
+            -- Upsert so a concurrent first insert of the same user (e.g. from /auth)
+            -- turns into an update instead of a unique_violation.
+            -- xmax = 0 only for freshly inserted rows; no row means nothing changed.
+            INSERT INTO users AS u (telegram_id, username, family_id)
+            VALUES (p_tg_id, p_username, v_fid)
+            ON CONFLICT (telegram_id) DO UPDATE SET family_id = EXCLUDED.family_id
+            WHERE u.family_id IS DISTINCT FROM EXCLUDED.family_id
+            RETURNING (u.xmax = 0) INTO v_created;
+
+            IF NOT FOUND THEN
+                RETURN QUERY SELECT 'already_member'::text, v_fid;
+            ELSIF v_created THEN
+                RETURN QUERY SELECT 'created'::text, v_fid;
+            ELSE
+                RETURN QUERY SELECT 'joined'::text, v_fid;
+            END IF;
+        END;
+        $$
+    """)
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS join_family(bigint, text, text)")
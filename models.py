@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -16,14 +16,18 @@ class User(Base):
 
     telegram_id = Column(BigInteger, primary_key=True, index=True)
     username = Column(String, nullable=True)
-    family_id = Column(Integer, ForeignKey("families.id"))
+    family_id = Column(Integer, ForeignKey("families.id"), index=True)
 
     family = relationship("Family", back_populates="users")
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Also serves family_id-only lookups (leftmost prefix)
+        Index("ix_items_family_id_id", "family_id", "id"),
+    )
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     text = Column(String)
     is_bought = Column(Boolean, default=False)
     category = Column(String)